@@ -1,17 +1,33 @@
 import os
 import sys
 import zipfile
-import json
 import shutil
 import logging
 import argparse
 from email.utils import formatdate
 import math
-from jinja2 import Environment, FileSystemLoader, TemplateNotFound, TemplateSyntaxError
+import hashlib
+import operator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, TemplateNotFound, TemplateSyntaxError
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import threading
 import time
 import re
+import html
+
+# orjson parses bytes directly and is considerably faster than the stdlib;
+# fall back to json when it is not installed.
+try:
+    from orjson import loads as json_loads, dumps as json_dumps
+except ImportError:
+    import json
+    json_loads = json.loads
+
+    def json_dumps(obj):
+        return json.dumps(obj).encode('utf-8')
 
 # List of required templates
 REQUIRED_TEMPLATES = [
@@ -23,219 +39,389 @@ REQUIRED_TEMPLATES = [
     'contacts.html'
 ]
 
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+# A single environment whose compiled templates are shared by every render call,
+# built by load_templates() so importing the module never touches the filesystem.
+ENV = None
+TEMPLATES = {}
+
 def setup_logging(verbose):
     level = logging.DEBUG if verbose else logging.INFO
     logging.basicConfig(level=level, format='%(asctime)s - %(levelname)s - %(message)s')
 
 GENERIC_AVATAR_URL = "https://www.flickr.com/images/buddyicon.gif"
 
-def get_flickr_buddy_icon_url(flickr_url, last_fetch_times):
+# Flickr profile pages show the avatar as the background image of a <div> that has an "avatar"
+# or "person" class, e.g. <div class="avatar person" style="background-image: url(//...)">.
+# AVATAR_DIV_RE finds that opening tag (class as a whitespace-delimited token, either quote
+# style), then the style attribute and its url(...) are read from the tag, in any attribute order.
+AVATAR_DIV_RE = re.compile(rb'<div(?=\s)[^>]*?\sclass\s*=\s*'
+                           rb'(?:"(?:[^"]*\s)?(?:avatar|person)(?:\s[^"]*)?"'
+                           rb"|'(?:[^']*\s)?(?:avatar|person)(?:\s[^']*)?')[^>]*>",
+                           re.IGNORECASE)
+STYLE_ATTR_RE = re.compile(rb'''\sstyle\s*=\s*(?:"([^"]*)"|'([^']*)')''', re.IGNORECASE)
+STYLE_URL_RE = re.compile(rb'url\(\s*([^)]*?)\s*\)', re.IGNORECASE)
+
+IMAGE_SUFFIXES = ('.jpg', '.png')
+
+# Avatars are fetched concurrently over a shared, pooled session
+MAX_AVATAR_WORKERS = 8
+FLICKR_REQUESTS_PER_SECOND = 8
+
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=32, pool_maxsize=32,
+                                      max_retries=Retry(total=3, backoff_factor=0.5)))
+
+class RateLimiter:
+    """Spaces calls to wait() so that at most `rate` proceed per second across all threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+flickr_rate_limiter = RateLimiter(FLICKR_REQUESTS_PER_SECOND)
+
+def is_not_modified(response, last_fetch):
+    if response.status_code == 304:  # Not Modified
+        return True
+    etag = response.headers.get('ETag')
+    return bool(etag) and etag == last_fetch.get('etag')
+
+def get_flickr_buddy_icon_url(flickr_url, last_fetch_times, avatar_exists=False):
+    """
+    Look up the avatar URL on a contact's Flickr profile page.
+
+    Conditional requests are only made when the avatar from a previous run is still on disk,
+    starting with a HEAD probe so an unchanged page costs no body bytes.
+
+    :return: A tuple of (avatar_url, status, etag) where status is 'new', 'unchanged' or 'missing'
+    """
     try:
         headers = {}
-        if flickr_url in last_fetch_times:
-            headers['If-Modified-Since'] = last_fetch_times[flickr_url]
-
-        response = requests.get(flickr_url, headers=headers)
-        if response.status_code == 304:  # Not Modified
+        last_fetch = last_fetch_times.get(flickr_url) if avatar_exists else None
+        if isinstance(last_fetch, str):  # Older last_fetch.json files only stored the date
+            last_fetch = {'date': last_fetch}
+        if last_fetch:
+            headers['If-Modified-Since'] = last_fetch['date']
+            if last_fetch.get('etag'):
+                headers['If-None-Match'] = last_fetch['etag']
+
+            flickr_rate_limiter.wait()
+            response = SESSION.head(flickr_url, headers=headers, allow_redirects=True)
+            if is_not_modified(response, last_fetch):
+                logging.debug(f"Avatar for {flickr_url} not modified since last fetch")
+                return None, 'unchanged', last_fetch.get('etag')
+
+        flickr_rate_limiter.wait()
+        response = SESSION.get(flickr_url, headers=headers)
+        if last_fetch and is_not_modified(response, last_fetch):
             logging.debug(f"Avatar for {flickr_url} not modified since last fetch")
-            return None, False
+            return None, 'unchanged', last_fetch.get('etag')
 
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        avatar_div = soup.find('div', class_=['avatar', 'person'])
-        if avatar_div:
-            style = avatar_div.get('style')
-            if style:
-                match = re.search(r'url\((.*?)\)', style)
-                if match:
-                    avatar_url = match.group(1).strip("'\"")
-                    if avatar_url.startswith('//'):
-                        avatar_url = 'https:' + avatar_url
-                    logging.debug(f"Found avatar URL for {flickr_url}: {avatar_url}")
-                    return avatar_url, True
+
+        avatar_div = AVATAR_DIV_RE.search(response.content)
+        style = STYLE_ATTR_RE.search(avatar_div.group(0)) if avatar_div else None
+        match = STYLE_URL_RE.search(style.group(1) or style.group(2)) if style else None
+        if match:
+            # The url sits inside an HTML attribute, so entities such as &quot; must be decoded first
+            avatar_url = html.unescape(match.group(1).decode('utf-8', 'replace')).strip().strip("'\"")
+            if avatar_url.startswith('//'):
+                avatar_url = 'https:' + avatar_url
+            logging.debug(f"Found avatar URL for {flickr_url}: {avatar_url}")
+            return avatar_url, 'new', response.headers.get('ETag')
 
         logging.debug(f"No avatar found for {flickr_url}")
-        return None, False
+        return None, 'missing', None
 
     except requests.RequestException as e:
         logging.error(f"Error fetching the Flickr page: {e}")
-        return None, False
-    finally:
-        time.sleep(1)  # Add a 1-second delay after each request, even if it fails
-
-def get_templates_env():
-    # Determine the directory of the current script
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    # Construct the path to the templates directory
-    templates_dir = os.path.join(script_dir, 'templates')
-    
-    # Setup the Jinja2 environment to load templates from the correct directory
-    env = Environment(loader=FileSystemLoader(templates_dir))
-    return env
+        return None, 'missing', None
+
+def load_templates():
+    global ENV
+    if ENV is None:
+        # The bytecode cache lets worker processes and later runs skip re-parsing, but is optional
+        try:
+            bytecode_cache = FileSystemBytecodeCache()
+        except (RuntimeError, OSError) as e:
+            logging.warning(f"Template bytecode cache unavailable, compiling templates in memory: {str(e)}")
+            bytecode_cache = None
+        ENV = Environment(loader=FileSystemLoader(TEMPLATES_DIR),
+                          bytecode_cache=bytecode_cache,
+                          auto_reload=False)
 
-def check_templates(env):
     missing_templates = []
     for template in REQUIRED_TEMPLATES:
         try:
-            env.get_template(template)
+            TEMPLATES[template] = ENV.get_template(template)
         except TemplateNotFound:
             missing_templates.append(template)
-    
+        except TemplateSyntaxError as e:
+            logging.error(f"Syntax error in template '{template}': {str(e)}")
+            raise
+
     if missing_templates:
         raise FileNotFoundError(f"The following template files are missing: {', '.join(missing_templates)}")
 
-def extract_zip_files(source_folder, dest_folder):
-    logging.info(f"Extracting ZIP files from {source_folder} to {dest_folder}")
-    for file in os.listdir(source_folder):
-        if file.endswith('.zip'):
-            logging.debug(f"Extracting {file}")
-            with zipfile.ZipFile(os.path.join(source_folder, file), 'r') as zip_ref:
-                zip_ref.extractall(dest_folder)
+# zlib releases the GIL while inflating, so archives can be extracted side by side
+MAX_EXTRACT_WORKERS = 8
+# Members are copied out in large chunks; Flickr exports are mostly multi-megabyte JPEGs
+EXTRACT_BUFFER_SIZE = 1 << 20
+
+def get_member_path(info, dest_folder):
+    # Sanitize the member name the way ZipFile.extract does, so entries can't escape dest_folder
+    arcname = info.filename.replace('/', os.sep)
+    if os.altsep:
+        arcname = arcname.replace(os.altsep, os.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    parts = [part for part in arcname.split(os.sep) if part not in ('', os.curdir, os.pardir)]
+    return os.path.join(dest_folder, *parts)
+
+def get_member_destinations(zip_paths, data_folder, images_folder):
+    """
+    Decide where every archive member is extracted to.
+
+    Each output path is assigned to exactly one archive, so concurrent extraction never has two
+    threads writing the same file. As with serial extraction, a later archive wins.
+
+    :return: A dict of zip_path -> {member name: output path}
+    """
+    owners = {}
+    for zip_path in zip_paths:
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            for info in zip_ref.infolist():
+                # Images go straight to their final folder, everything else to the data folder
+                dest_folder = images_folder if info.filename.endswith(IMAGE_SUFFIXES) else data_folder
+                path = get_member_path(info, dest_folder)
+                previous = owners.get(path)
+                if previous and previous[0] != zip_path and not info.is_dir():
+                    logging.warning(f"{info.filename} in {os.path.basename(zip_path)} replaces the copy "
+                                    f"in {os.path.basename(previous[0])}")
+                owners[path] = (zip_path, info.filename)
+
+    destinations = {zip_path: {} for zip_path in zip_paths}
+    for path, (zip_path, member_name) in owners.items():
+        destinations[zip_path][member_name] = path
+    return destinations
+
+def extract_zip_file(zip_path, members):
+    logging.debug(f"Extracting {os.path.basename(zip_path)}")
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        for info in zip_ref.infolist():
+            path = members.get(info.filename)
+            if path is None:
+                continue  # Extracted from another archive instead
+            if info.is_dir():
+                os.makedirs(path, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with zip_ref.open(info) as src, open(path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, EXTRACT_BUFFER_SIZE)
+            # Keep the archive's timestamp so unchanged files look unchanged to the render cache
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+            os.utime(path, (mtime, mtime))
+
+def extract_zip_files(source_folder, data_folder, images_folder):
+    logging.info(f"Extracting ZIP files from {source_folder} to {data_folder} and {images_folder}")
+    with os.scandir(source_folder) as entries:
+        zip_paths = [entry.path for entry in entries if entry.name.endswith('.zip')]
+    if not zip_paths:
+        return
+
+    destinations = get_member_destinations(zip_paths, data_folder, images_folder)
+    with ThreadPoolExecutor(max_workers=min(MAX_EXTRACT_WORKERS, len(zip_paths))) as executor:
+        list(executor.map(lambda zip_path: extract_zip_file(zip_path, destinations[zip_path]), zip_paths))
 
 def get_photo_filename_mapping(images_folder):
     logging.info("Creating photo filename mapping")
     mapping = {}
-    for filename in os.listdir(images_folder):
-        if filename.endswith('_o.jpg'):
-            parts = filename.split('_')
-            if len(parts) >= 2:
-                photo_id = parts[-2]  # The ID is the second-to-last part
-                mapping[photo_id] = filename
+    with os.scandir(images_folder) as entries:
+        for entry in entries:
+            filename = entry.name
+            if filename.endswith('_o.jpg'):
+                # The ID is the second-to-last '_'-separated part
+                base, _, _ = filename.rpartition('_')
+                _, _, photo_id = base.rpartition('_')
+                if photo_id:
+                    mapping[photo_id] = filename
     logging.debug(f"Found {len(mapping)} photo mappings")
     return mapping
 
-def render_template(env, template_name, **kwargs):
-    try:
-        template = env.get_template(template_name)
-        return template.render(**kwargs)
-    except TemplateNotFound:
-        logging.error(f"Template not found: {template_name}")
-        raise
-    except TemplateSyntaxError as e:
-        logging.error(f"Syntax error in template '{template_name}': {str(e)}")
-        raise
+# Output files get a large buffer so streamed template chunks reach disk in few writes
+WRITE_BUFFER_SIZE = 1 << 20
+
+def write_template(path, template_name, **kwargs):
+    with open(path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+        TEMPLATES[template_name].stream(**kwargs).dump(f)
+
+# Bump when a code change alters rendered output, so pages cached by older versions are rebuilt
+RENDER_CACHE_VERSION = 2
+RENDER_CACHE_SECTIONS = ('photo_page', 'album_page')
+
+def get_render_cache_file(dest_folder):
+    return os.path.join(dest_folder, '.cache', 'statickr.json')
 
-def create_index_html(env, dest_folder):
+def load_render_cache(cache_file):
+    # The cache is only an optimization: anything unreadable just means a full rebuild
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'rb') as f:
+                render_cache = json_loads(f.read())
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable render cache {cache_file}: {str(e)}")
+            render_cache = None
+        if not isinstance(render_cache, dict):
+            if render_cache is not None:
+                logging.warning(f"Ignoring render cache {cache_file}: unexpected structure")
+        elif render_cache.get('version') == RENDER_CACHE_VERSION:
+            # Reset any section that is not a dict, so lookups never fail on a hand-edited cache
+            for section in RENDER_CACHE_SECTIONS:
+                if not isinstance(render_cache.get(section, {}), dict):
+                    logging.warning(f"Ignoring '{section}' in render cache {cache_file}: unexpected structure")
+                    del render_cache[section]
+            return render_cache
+    return {'version': RENDER_CACHE_VERSION}
+
+def save_render_cache(cache_file, render_cache):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    # Write a temporary file and swap it in, so an interrupted run never leaves a truncated cache
+    tmp_file = cache_file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(json_dumps(render_cache))
+    os.replace(tmp_file, cache_file)
+
+def get_template_mtime(template_name):
+    return os.stat(TEMPLATES[template_name].filename).st_mtime_ns
+
+def get_fingerprint(*parts):
+    # Everything a rendered page depends on, reduced to a short string for the render cache
+    return hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+def is_render_cached(render_cache, section, key, fingerprint, path):
+    return render_cache.get(section, {}).get(key) == fingerprint and os.path.exists(path)
+
+def create_index_html(dest_folder):
     logging.info("Creating index.html")
-    content = render_template(env, 'index.html')
-    with open(os.path.join(dest_folder, 'index.html'), 'w') as f:
-        f.write(content)
+    write_template(os.path.join(dest_folder, 'index.html'), 'index.html')
 
 import logging
 
-def create_photo_page(env, photo, photo_mapping, dest_folder, user_avatar, user_name, albums):
+# Values shown on a photo page when the export leaves the field out
+PHOTO_PAGE_DEFAULTS = {
+    'name': 'Untitled',
+    'count_views': 0,
+    'count_faves': 0,
+    'count_comments': 0
+}
+
+def create_photo_page(photo, photo_mapping, photos_folder, user_avatar, user_name):
     try:
         photo_id = photo['id']
-        title = photo.get('name', 'Untitled')
-        description = photo.get('description', '')
-        count_views = photo.get('count_views', 0)
-        count_faves = photo.get('count_faves', 0)
-        count_comments = photo.get('count_comments', 0)
-        exif_data = photo.get('exif_data', {})
-        groups = photo.get('groups', [])
-        tags = photo.get('tags', [])
+        # The photo dict is handed to the template as-is; only defaults and derived fields are filled in
+        for key, default in PHOTO_PAGE_DEFAULTS.items():
+            photo.setdefault(key, default)
 
         img_filename = photo_mapping.get(photo_id, '')
-        img_src = f"../images/{img_filename}" if img_filename else ''
-
-        # Update the albums list to include icons
-        updated_albums = []
-        for album in albums:
-            updated_album = album.copy()  # Create a copy to avoid modifying the original album
-            cover_photo = album.get('cover_photo', '')
-            cover_photo_filename = cover_photo.split('/')[-1] if cover_photo else ''
-            updated_album['icon'] = f"../images/{cover_photo_filename}" if cover_photo_filename else '/images/album_cover.jpg'
-            updated_albums.append(updated_album)
-
-        # Update the groups list to include icons
-        updated_groups = []
-        for group in groups:
-            updated_group = group.copy()  # Create a copy to avoid modifying the original group
-            icon = group.get('icon', '')
-            updated_group['icon'] = f"/path_to_group_icons/{icon}" if icon else '/images/group_icon.jpg'
-            updated_groups.append(updated_group)
+        photo['img_src'] = f"../images/{img_filename}" if img_filename else ''
 
         # Debugging statements to check paths if the photo title is "180 RED Alef"
-        if title == "180 RED Alef":
-            logging.debug(f"Image source: {img_src}")
-            logging.debug(f"Updated Albums: {updated_albums}")
-            logging.debug(f"Updated Groups: {updated_groups}")
-
-        content = render_template(env, 'photo.html',
-                                  photo={
-                                      'id': photo_id,
-                                      'name': title,
-                                      'description': description,
-                                      'count_views': count_views,
-                                      'count_faves': count_faves,
-                                      'count_comments': count_comments,
-                                      'exif_data': exif_data,
-                                      'groups': updated_groups,
-                                      'tags': tags,
-                                      'img_src': img_src,
-                                  },
-                                  user_avatar=user_avatar,
-                                  user_name=user_name,
-                                  albums=updated_albums)
-
-        photo_folder = os.path.join(dest_folder, 'photos')
-        os.makedirs(photo_folder, exist_ok=True)
-        with open(os.path.join(photo_folder, f'{photo_id}.html'), 'w') as f:
-            f.write(content)
+        if photo['name'] == "180 RED Alef":
+            logging.debug(f"Image source: {photo['img_src']}")
+            logging.debug(f"Albums: {photo.get('albums', [])}")
+            logging.debug(f"Groups: {photo.get('groups', [])}")
+
+        output_path = f'{photos_folder}{os.sep}{photo_id}.html'
+        write_template(output_path, 'photo.html',
+                       photo=photo,
+                       user_avatar=user_avatar,
+                       user_name=user_name)
+        logging.info(f"Generated photo page: {output_path}")
+        return True
     except TemplateSyntaxError as e:
         logging.error(f"Failed to create photo page for photo ID {photo_id}: {str(e)}")
     except Exception as e:
         logging.error(f"Unexpected error creating photo page for photo ID {photo_id}: {str(e)}")
+    return False
 
+# Per-process state for the photo worker pool, set once by _init_photo_worker
+# so the shared arguments are pickled per worker rather than per task.
+_worker_args = ()
 
+def _init_photo_worker(photo_mapping, photos_folder, user_avatar, user_name):
+    global _worker_args
+    load_templates()
+    _worker_args = (photo_mapping, photos_folder, user_avatar, user_name)
 
+def _load_photo(path):
+    with open(path, 'rb') as f:
+        photo = json_loads(f.read())
+        photo['_mtime_ns'] = os.fstat(f.fileno()).st_mtime_ns
+    # Impute a missing date once so every later sort can use a plain itemgetter
+    photo['date_taken'] = photo.get('date_taken') or ''
+    return photo
 
-def create_photo_html(env, photo_id, photo_metadata, user_name, user_avatar, prev_photo_id, next_photo_id, output_path, photo_mapping):
-    try:
-        template = env.get_template('photo.html')
-        img_filename = photo_mapping.get(photo_id, f"{photo_id}_o.jpg")
-        photo_data = {
-            'photo': {
-                'id': photo_id,
-                'name': photo_metadata.get('name', 'Untitled'),
-                'description': photo_metadata.get('description', ''),
-                'img_src': f"../images/{img_filename}",  # This is the important line
-                'count_views': photo_metadata.get('count_views', 0),
-                'count_faves': photo_metadata.get('count_faves', 0),
-                'count_comments': photo_metadata.get('count_comments', 0),
-                'exif_data': photo_metadata.get('exif_data', {}),
-                'groups': photo_metadata.get('groups', []),
-                'albums': photo_metadata.get('albums', []),
-                'tags': photo_metadata.get('tags', [])
-            },
-            'user_avatar': user_avatar,
-            'user_name': user_name,
-            'prev_photo': prev_photo_id,
-            'next_photo': next_photo_id
-        }
-        output = template.render(photo_data)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(output)
-        logging.info(f"Generated photo page: {output_path}")
-    except Exception as e:
-        logging.error(f"Error creating photo HTML for {photo_id}: {str(e)}")
+def _render_photo_page(photo):
+    return create_photo_page(photo, *_worker_args)
 
-def create_photos_html(env, data_folder, dest_folder, photo_mapping, oldest_first, enable_paging, photos_per_page, user_avatar, user_name, albums):
+def create_photos_html(data_folder, dest_folder, photo_mapping, oldest_first, enable_paging, photos_per_page, user_avatar, user_name, render_cache):
     logging.info("Creating photos/index.html")
-    photos = []
     photos_folder = os.path.join(dest_folder, 'photos')
     os.makedirs(photos_folder, exist_ok=True)
 
-    for file in os.listdir(data_folder):
-        if file.startswith('photo_') and file.endswith('.json'):
-            with open(os.path.join(data_folder, file), 'r') as f:
-                photo_data = json.load(f)
-                photos.append(photo_data)
+    with os.scandir(data_folder) as entries:
+        photo_files = [entry.path for entry in entries
+                       if entry.name.startswith('photo_') and entry.name.endswith('.json')]
+
+    with ProcessPoolExecutor(max_workers=os.cpu_count(),
+                             initializer=_init_photo_worker,
+                             initargs=(photo_mapping, photos_folder, user_avatar, user_name)) as executor:
+        photos = list(executor.map(_load_photo, photo_files, chunksize=64))
+
+        # Sort photos by date
+        photos.sort(key=operator.itemgetter('date_taken'), reverse=not oldest_first)
+
+        photo_ids = {photo['id'] for photo in photos}
+        for photo_id in photo_mapping:
+            if photo_id not in photo_ids:
+                logging.warning(f"Metadata file not found for photo {photo_id}, skipping.")
+
+        # Individual photo pages, each rendered exactly once and only if its inputs changed
+        template_mtime = get_template_mtime('photo.html')
+        stale_photos = []
+        fingerprints = []
+        for index, photo in enumerate(photos):
+            photo_id = photo['id']
+            img_filename = photo_mapping.get(photo_id, '')
+            photo['img_src'] = f"../images/{img_filename}"
+            # Prev/next follow the listing order, so neighbours come straight from the sorted list
+            photo['prev_photo'] = photos[index - 1]['id'] if index > 0 else None
+            photo['next_photo'] = photos[index + 1]['id'] if index < len(photos) - 1 else None
+            fingerprint = get_fingerprint(photo['_mtime_ns'], template_mtime, img_filename, user_avatar, user_name,
+                                          photo['prev_photo'], photo['next_photo'])
+            if is_render_cached(render_cache, 'photo_page', photo_id, fingerprint, f'{photos_folder}{os.sep}{photo_id}.html'):
+                logging.debug(f"Skipping unchanged photo page for photo ID {photo_id}")
+            else:
+                stale_photos.append(photo)
+                fingerprints.append(fingerprint)
 
-    # Sort photos by date
-    photos.sort(key=lambda x: x.get('date_taken', ''), reverse=not oldest_first)
+        page_cache = render_cache.setdefault('photo_page', {})
+        rendered = executor.map(_render_photo_page, stale_photos, chunksize=64)
+        for photo, fingerprint, success in zip(stale_photos, fingerprints, rendered):
+            if success:
+                page_cache[photo['id']] = fingerprint
 
+    # Listing pages
     total_pages = math.ceil(len(photos) / photos_per_page) if enable_paging else 1
 
     for page in range(1, total_pages + 1):
@@ -243,123 +429,101 @@ def create_photos_html(env, data_folder, dest_folder, photo_mapping, oldest_firs
         end_idx = start_idx + photos_per_page
         page_photos = photos[start_idx:end_idx] if enable_paging else photos
 
-        for photo in page_photos:
-            photo['img_src'] = f"../images/{photo_mapping.get(photo['id'], '')}"
-            create_photo_page(env, photo, photo_mapping, dest_folder, user_avatar, user_name, albums)
-
-        content = render_template(env, 'photos.html',
-                                  photos=page_photos,
-                                  page=page,
-                                  total_pages=total_pages,
-                                  enable_paging=enable_paging)
-
-        with open(os.path.join(photos_folder, f'index{page}.html'), 'w') as f:
-            f.write(content)
+        write_template(os.path.join(photos_folder, f'index{page}.html'), 'photos.html',
+                       photos=page_photos,
+                       page=page,
+                       total_pages=total_pages,
+                       enable_paging=enable_paging)
 
     if enable_paging:
         shutil.copy(os.path.join(photos_folder, 'index1.html'), os.path.join(photos_folder, 'index.html'))
 
-def create_albums_html(env, data_folder, dest_folder, photo_mapping, oldest_first):
+    return photos
+
+def create_albums_html(data_folder, dest_folder, photo_mapping, photos_by_id, oldest_first, render_cache):
     logging.info("Creating albums/index.html and individual album pages")
     albums_file = os.path.join(data_folder, 'albums.json')
     albums_folder = os.path.join(dest_folder, 'albums')
     os.makedirs(albums_folder, exist_ok=True)
 
-    with open(albums_file, 'r') as f:
-        albums_data = json.load(f)
+    with open(albums_file, 'rb') as f:
+        albums_data = json_loads(f.read())
+        albums_mtime = os.fstat(f.fileno()).st_mtime_ns
 
-    # Sort albums by date
-    albums_data['albums'].sort(key=lambda x: x.get('created', ''), reverse=not oldest_first)
+    # Sort albums by date, imputing a missing date first as _load_photo does for photos
+    for album in albums_data['albums']:
+        album['created'] = album.get('created') or ''
+    albums_data['albums'].sort(key=operator.itemgetter('created'), reverse=not oldest_first)
 
     for album in albums_data['albums']:
         album['cover_photo_filename'] = photo_mapping.get(album.get('cover_photo', '').split('/')[-1], '')
-        create_album_page(env, album, data_folder, albums_folder, photo_mapping, oldest_first)
-
-    content = render_template(env, 'albums.html', albums=albums_data['albums'])
+        create_album_page(album, albums_folder, photos_by_id, oldest_first, albums_mtime, render_cache)
 
-    with open(os.path.join(albums_folder, 'index.html'), 'w') as f:
-        f.write(content)
+    write_template(os.path.join(albums_folder, 'index.html'), 'albums.html', albums=albums_data['albums'])
 
-def create_album_page(env, album, data_folder, albums_folder, photo_mapping, oldest_first):
+def create_album_page(album, albums_folder, photos_by_id, oldest_first, albums_mtime, render_cache):
     album_id = album['id']
     title = album.get('title', 'Untitled Album')
     photos = album.get('photos', [])
 
     logging.debug(f"Creating album page for '{title}' (ID: {album_id})")
 
-    album_photos = []
-    for photo_id in photos:
-        photo_file = os.path.join(data_folder, f'photo_{photo_id}.json')
-        if os.path.exists(photo_file):
-            with open(photo_file, 'r') as f:
-                photo_data = json.load(f)
-                photo_data['img_src'] = f"../images/{photo_mapping.get(photo_id, '')}"
-                album_photos.append(photo_data)
+    album_photos = [photos_by_id[photo_id] for photo_id in photos if photo_id in photos_by_id]
+
+    # Sort photos by date; only the album's own photos, using the date imputed at load time
+    album_photos.sort(key=operator.itemgetter('date_taken'), reverse=not oldest_first)
 
-    # Sort photos by date
-    album_photos.sort(key=lambda x: x.get('date_taken', ''), reverse=not oldest_first)
+    album_path = f'{albums_folder}{os.sep}{album_id}.html'
+    fingerprint = get_fingerprint(albums_mtime, get_template_mtime('album.html'),
+                                  [(photo['id'], photo['_mtime_ns'], photo['img_src']) for photo in album_photos])
+    if is_render_cached(render_cache, 'album_page', album_id, fingerprint, album_path):
+        logging.debug(f"Skipping unchanged album page for '{title}' (ID: {album_id})")
+        return
 
-    content = render_template(env, 'album.html', title=title, photos=album_photos)
+    write_template(album_path, 'album.html', title=title, photos=album_photos)
+    render_cache.setdefault('album_page', {})[album_id] = fingerprint
 
-    with open(os.path.join(albums_folder, f'{album_id}.html'), 'w') as f:
-        f.write(content)
+UNSAFE_FILENAME_CHARS_RE = re.compile(r'[^\w\-_\. ]')
 
 def create_safe_filename(name):
     # Remove any non-alphanumeric characters and replace spaces with underscores
-    safe_name = re.sub(r'[^\w\-_\. ]', '', name)
+    safe_name = UNSAFE_FILENAME_CHARS_RE.sub('', name)
     safe_name = safe_name.replace(' ', '_')
     # Limit the length of the filename
     return safe_name[:50]  # Limiting to 50 characters
 
-def create_contacts_html(env, data_folder, dest_folder, fetch_avatars, skip_existing_avatars):
-    logging.info("Creating contacts/index.html")
-    contacts_file = os.path.join(data_folder, 'contacts_part001.json')
-    contacts_folder = os.path.join(dest_folder, 'contacts')
-    avatars_folder = os.path.join(dest_folder, 'avatars')
-    os.makedirs(contacts_folder, exist_ok=True)
-    os.makedirs(avatars_folder, exist_ok=True)
-
-    # Load the last fetch times
-    last_fetch_file = os.path.join(avatars_folder, 'last_fetch.json')
-    if os.path.exists(last_fetch_file):
-        with open(last_fetch_file, 'r') as f:
-            last_fetch_times = json.load(f)
-    else:
-        last_fetch_times = {}
-
-    with open(contacts_file, 'r') as f:
-        contacts_data = json.load(f)
-
-    if not isinstance(contacts_data, dict) or 'contacts' not in contacts_data:
-        raise ValueError(f"Unexpected structure in {contacts_file}: expected a dictionary with a 'contacts' key")
-
-    contacts = contacts_data['contacts']
-    updated_contacts = []
-
-    for name, url in contacts.items():
-        avatar_url = None
-
-        safe_name = create_safe_filename(name)
-        avatar_filename = f"{safe_name}.jpg"
-        avatar_path = os.path.join(avatars_folder, avatar_filename)
+def create_contact(name, url, contacts_folder, avatars_folder, avatar_locks, last_fetch_times, fetch_avatars, skip_existing_avatars):
+    safe_name = create_safe_filename(name)
+    avatar_filename = f"{safe_name}.jpg"
+    avatar_path = os.path.join(avatars_folder, avatar_filename)
+    # Contacts whose names sanitize to the same filename share one avatar file; only one of them
+    # may check, download and write it at a time
+    with avatar_locks[safe_name]:
+        avatar_exists = os.path.exists(avatar_path)
 
-        if skip_existing_avatars and os.path.exists(avatar_path):
+        if skip_existing_avatars and avatar_exists:
             logging.debug(f"Skipping fetch for existing avatar: {avatar_path}")
             avatar_relative_path = os.path.relpath(avatar_path, contacts_folder)
         else:
             if fetch_avatars:
-                avatar_url, modified = get_flickr_buddy_icon_url(url, last_fetch_times)
+                avatar_url, status, etag = get_flickr_buddy_icon_url(url, last_fetch_times, avatar_exists)
             else:
-                modified = False
+                status = 'missing'
 
-            if avatar_url and modified:
+            if status == 'unchanged':
+                logging.debug(f"Reusing unchanged avatar: {avatar_path}")
+                avatar_relative_path = os.path.relpath(avatar_path, contacts_folder)
+            elif status == 'new':
                 try:
-                    response = requests.get(avatar_url)
+                    response = SESSION.get(avatar_url)
                     response.raise_for_status()
                     with open(avatar_path, 'wb') as f:
                         f.write(response.content)
                     logging.debug(f"Successfully saved avatar to {avatar_path}")
-                    last_fetch_times[url] = formatdate(timeval=None, localtime=False, usegmt=True)
+                    last_fetch_times[url] = {
+                        'date': formatdate(timeval=None, localtime=False, usegmt=True),
+                        'etag': etag
+                    }
                     avatar_relative_path = os.path.relpath(avatar_path, contacts_folder)
                 except requests.RequestException as e:
                     logging.error(f"Failed to fetch avatar for {name}: {e}")
@@ -368,65 +532,62 @@ def create_contacts_html(env, data_folder, dest_folder, fetch_avatars, skip_exis
                     logging.error(f"Failed to save avatar for {name}: {e}")
                     avatar_relative_path = os.path.relpath(GENERIC_AVATAR_URL, contacts_folder)
             else:
-                logging.debug(f"No avatar URL found or not modified for {name}, using generic avatar")
+                logging.debug(f"No avatar URL found for {name}, using generic avatar")
                 avatar_relative_path = os.path.relpath(GENERIC_AVATAR_URL, contacts_folder)
 
-        updated_contacts.append({
-            "name": name,
-            "url": url,
-            "avatar": avatar_relative_path
-        })
+    return {
+        "name": name,
+        "url": url,
+        "avatar": avatar_relative_path
+    }
 
-    # Save the updated last fetch times
-    with open(last_fetch_file, 'w') as f:
-        json.dump(last_fetch_times, f)
+def create_contacts_html(data_folder, dest_folder, fetch_avatars, skip_existing_avatars):
+    logging.info("Creating contacts/index.html")
+    contacts_file = os.path.join(data_folder, 'contacts_part001.json')
+    contacts_folder = os.path.join(dest_folder, 'contacts')
+    avatars_folder = os.path.join(dest_folder, 'avatars')
+    os.makedirs(contacts_folder, exist_ok=True)
+    os.makedirs(avatars_folder, exist_ok=True)
 
-    content = render_template(env, 'contacts.html', contacts=updated_contacts)
+    # Load the last fetch times
+    last_fetch_file = os.path.join(avatars_folder, 'last_fetch.json')
+    if os.path.exists(last_fetch_file):
+        with open(last_fetch_file, 'rb') as f:
+            last_fetch_times = json_loads(f.read())
+    else:
+        last_fetch_times = {}
 
-    with open(os.path.join(contacts_folder, 'index.html'), 'w') as f:
-        f.write(content)
+    with open(contacts_file, 'rb') as f:
+        contacts_data = json_loads(f.read())
 
+    if not isinstance(contacts_data, dict) or 'contacts' not in contacts_data:
+        raise ValueError(f"Unexpected structure in {contacts_file}: expected a dictionary with a 'contacts' key")
+
+    contacts = contacts_data['contacts']
+
+    avatar_locks = {create_safe_filename(name): threading.Lock() for name in contacts}
+
+    with ThreadPoolExecutor(max_workers=MAX_AVATAR_WORKERS) as executor:
+        updated_contacts = list(executor.map(
+            lambda contact: create_contact(contact[0], contact[1], contacts_folder, avatars_folder, avatar_locks,
+                                           last_fetch_times, fetch_avatars, skip_existing_avatars),
+            contacts.items()))
+
+    # Save the updated last fetch times
+    with open(last_fetch_file, 'wb') as f:
+        f.write(json_dumps(last_fetch_times))
+
+    write_template(os.path.join(contacts_folder, 'index.html'), 'contacts.html', contacts=updated_contacts)
 
-def get_navigation_photos(current_photo_id, photo_ids):
-    """
-    Get the previous and next photo IDs for navigation.
-    
-    :param current_photo_id: The ID of the current photo
-    :param photo_ids: A list of all photo IDs
-    :return: A tuple of (previous_photo_id, next_photo_id)
-    """
-    try:
-        current_index = photo_ids.index(current_photo_id)
-        prev_photo_id = photo_ids[current_index - 1] if current_index > 0 else None
-        next_photo_id = photo_ids[current_index + 1] if current_index < len(photo_ids) - 1 else None
-        return prev_photo_id, next_photo_id
-    except ValueError:
-        logging.warning(f"Photo ID {current_photo_id} not found in the list of photos.")
-        return None, None
-    
 def process_flickr_data(source_folder, dest_folder, verbose, oldest_first, enable_paging, photos_per_page, fetch_avatars, skip_existing_avatars):
     setup_logging(verbose)
     
-    # Adjust the template directory path
-    template_dir = os.path.join(os.path.dirname(__file__), 'templates')
-    env = Environment(loader=FileSystemLoader(template_dir))
-
     try:
-        missing_templates = []
-        for template_name in REQUIRED_TEMPLATES:
-            try:
-                env.get_template(template_name)
-            except TemplateNotFound:
-                missing_templates.append(template_name)
-        
-        if missing_templates:
-            logging.error(f"Missing templates: {', '.join(missing_templates)}")
-            sys.exit(1)
-        
-    except TemplateNotFound as e:
-        logging.error(f"Missing template: {e.name}")
+        load_templates()
+    except (FileNotFoundError, TemplateSyntaxError) as e:
+        logging.error(str(e))
         sys.exit(1)
-        
+
     logging.info(f"Processing Flickr data from {source_folder} to {dest_folder}")
 
     data_folder = os.path.join(dest_folder, 'data')
@@ -436,53 +597,27 @@ def process_flickr_data(source_folder, dest_folder, verbose, oldest_first, enabl
     os.makedirs(images_folder, exist_ok=True)
 
     try:
-        extract_zip_files(source_folder, data_folder)
-        
-        logging.info("Moving image files to the images folder")
-        for file in os.listdir(data_folder):
-            if file.endswith('.jpg') or file.endswith('.png'):
-                shutil.move(os.path.join(data_folder, file), os.path.join(images_folder, file))
+        extract_zip_files(source_folder, data_folder, images_folder)
 
         photo_mapping = get_photo_filename_mapping(images_folder)
 
         # Extract user avatar and name from account_profile.json
         account_profile_file = os.path.join(data_folder, 'account_profile.json')
-        with open(account_profile_file, 'r') as f:
-            account_profile = json.load(f)
+        with open(account_profile_file, 'rb') as f:
+            account_profile = json_loads(f.read())
             user_avatar = account_profile.get('avatar', GENERIC_AVATAR_URL)
             user_name = account_profile.get('real_name', 'Unknown User')
 
-        # Extract albums data from albums.json
-        albums_file = os.path.join(data_folder, 'albums.json')
-        with open(albums_file, 'r') as f:
-            albums_data = json.load(f)
-            albums = albums_data.get('albums', [])
-
-        create_index_html(env, dest_folder)
-        create_photos_html(env, data_folder, dest_folder, photo_mapping, oldest_first, enable_paging, photos_per_page, user_avatar, user_name, albums)
-        create_albums_html(env, data_folder, dest_folder, photo_mapping, oldest_first)
-        create_contacts_html(env, data_folder, dest_folder, fetch_avatars, skip_existing_avatars)
-
-        # Generate individual photo pages
-        for photo_id, filename in photo_mapping.items():
-            photo_metadata_file = os.path.join(data_folder, f'photo_{photo_id}.json')
-            if os.path.exists(photo_metadata_file):
-                with open(photo_metadata_file, 'r') as f:
-                    photo_metadata = json.load(f)
-                prev_photo_id, next_photo_id = get_navigation_photos(photo_id, list(photo_mapping.keys()))
-                create_photo_html(
-                    env,
-                    photo_id,
-                    photo_metadata,
-                    user_name,
-                    user_avatar,
-                    prev_photo_id,
-                    next_photo_id,
-                    os.path.join(dest_folder, 'photos', f"{photo_id}.html"),
-                    photo_mapping  
-                )
-            else:
-                logging.warning(f"Metadata file not found for photo {photo_id}, skipping.")
+        render_cache_file = get_render_cache_file(dest_folder)
+        render_cache = load_render_cache(render_cache_file)
+
+        create_index_html(dest_folder)
+        photos = create_photos_html(data_folder, dest_folder, photo_mapping, oldest_first, enable_paging, photos_per_page, user_avatar, user_name, render_cache)
+        photos_by_id = {photo['id']: photo for photo in photos}
+        create_albums_html(data_folder, dest_folder, photo_mapping, photos_by_id, oldest_first, render_cache)
+        create_contacts_html(data_folder, dest_folder, fetch_avatars, skip_existing_avatars)
+
+        save_render_cache(render_cache_file, render_cache)
 
         logging.info("Flickr archive processing complete")
     except Exception as e: